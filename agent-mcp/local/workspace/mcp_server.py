@@ -7,6 +7,10 @@ from binance.client import Client
 
 mcp = FastMCP("McpServer")
 
+# one Binance client per process, so its requests.Session keeps the
+# connection to the API alive between tool calls
+binance_client: Client = None
+
 
 @mcp.tool()
 def add(a: int, b: int) -> int:
@@ -32,9 +36,11 @@ def get_current_date() -> str:
 @mcp.tool()
 def get_coin_price(symbol: str) -> float:
     """Get the price of a coin by ticker symbol. Default denominator is USDT."""
-    client = Client()
+    global binance_client
+    if binance_client is None:
+        binance_client = Client(requests_params={"timeout": 5})
     symbol_usdt = symbol + "USDT"
-    price = client.get_symbol_ticker(symbol=symbol_usdt)
+    price = binance_client.get_symbol_ticker(symbol=symbol_usdt)
     return float(price["price"])
 
 
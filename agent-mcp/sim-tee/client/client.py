@@ -1,5 +1,6 @@
 import os
 import json
+import base64
 
 import requests
 
@@ -12,14 +13,21 @@ class ClientRequest:
     public_key: str = ""
     api_key: str
     att: dict
+    session: requests.Session
+    encoding: str
 
-    def __init__(self, tee_endpoint: str = "http://127.0.0.1:8000"):
+    def __init__(self, tee_endpoint: str = "http://127.0.0.1:8000", encoding: str = "base64"):
         self.api_key = os.getenv("PLATFORM_API_KEY")
         self.platform = os.getenv("PLATFORM")
         self.model = os.getenv("MODEL")
         if not self.api_key:
             raise Exception('API key is required')
         self.tee_endpoint = tee_endpoint
+        # "base64" or "hex" for the binary request fields and the response signature;
+        # base64 is 33% larger than the raw bytes where hex is 100% larger
+        self.encoding = encoding
+        # one keep-alive connection serves the attestation fetch and every chat call
+        self.session = requests.Session()
         self.signer = Signer()
         self.init_keys()
 
@@ -29,7 +37,7 @@ class ClientRequest:
         self.public_key = self.att["public_key"].hex()
 
     def verify_attestation(self) -> bool:
-        att = requests.get(f"{self.tee_endpoint}/attestation").json()
+        att = self.session.get(f"{self.tee_endpoint}/attestation").json()
         if att.get("mock"):
             self.att = {
                 "public_key": bytes.fromhex(att["attestation_doc"]["public_key"]),
@@ -43,25 +51,44 @@ class ClientRequest:
             print("Verifying TEE Enclave Identity:", result)
             return result
 
+    def encode(self, value: bytes) -> str:
+        if self.encoding == "base64":
+            return base64.b64encode(value).decode()
+        return value.hex()
+
+    def decode(self, value: str) -> bytes:
+        if self.encoding == "base64":
+            return base64.b64decode(value)
+        return bytes.fromhex(value)
+
     def chat(self, message: str):
+        return self.talk({"message": message})
+
+    def chat_batch(self, messages: list):
+        # up to 16 prompts in one request; the TEE runs them concurrently and
+        # returns the list of results under a single signature
+        return self.talk({"messages": messages})
+
+    def talk(self, prompt: dict):
         data = {
             "api_key": self.api_key,
-            "message": message,
             "platform": self.platform,
             "ai_model": self.model,
+            **prompt,
         }
 
         nonce = os.urandom(32)
 
         req = {
-            "nonce": nonce.hex(),
-            "public_key": self.signer.get_public_key_der().hex(),
-            "data": self.signer.encrypt(bytes.fromhex(self.public_key), nonce, json.dumps(data).encode()).hex()
+            "nonce": self.encode(nonce),
+            "public_key": self.encode(self.signer.get_public_key_der()),
+            "data": self.encode(self.signer.encrypt(bytes.fromhex(self.public_key), nonce, json.dumps(data).encode())),
+            "encoding": self.encoding,
         }
-        resp = requests.post(f"{self.tee_endpoint}/talk", json=req).json()
+        resp = self.session.post(f"{self.tee_endpoint}/talk", json=req).json()
 
         print()
-        print('prompt:', message)
+        print('prompt:', prompt.get("message", prompt.get("messages")))
         print("raw response: ", resp)
         print("verify signature:", self.verify_sig(resp["data"], resp["sig"]))
 
@@ -71,5 +98,5 @@ class ClientRequest:
         return Verifier.verify_signature(
             pub_key=bytes.fromhex(self.public_key),
             msg=data,
-            signature=bytes.fromhex(sig),
+            signature=self.decode(sig),
         )
@@ -14,3 +14,6 @@ if __name__ == '__main__':
     # Example usage with general chat agent
     # client.chat("Hello")
     # client.chat("What's the date today")
+
+    # Several prompts in one request, answered under one signature
+    # client.chat_batch(["Bitcoin Price today right now", "What's the date today"])
@@ -1,17 +1,26 @@
 import os
-import json
+import base64
 import argparse
 import time
+import asyncio
 import dataclasses
+import hashlib
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import AsyncExitStack
+from typing import Literal, Optional
 
-import requests
+import anyio
+import httpx
+import orjson
 import uvicorn
 
 from fastapi import FastAPI, Request
-from fastapi.responses import JSONResponse
-from pydantic import BaseModel
+from fastapi.responses import ORJSONResponse, Response
+from pydantic import BaseModel, model_validator
 from mcp import ClientSession, StdioServerParameters
 from mcp.client.stdio import stdio_client
+from mcp.shared.exceptions import McpError
 from autogen import LLMConfig
 from autogen.agentchat import AssistantAgent
 from autogen.mcp import create_toolkit
@@ -21,115 +30,337 @@ from util.server import Server, ENCLAVE_SERVER_PORT
 from util.log import logger
 
 
-HexStr = str
+LLM_CONFIG_CACHE_SIZE = 128
+RESPONSE_CACHE_SIZE = 4096
+RESPONSE_CACHE_TTL = 60  # seconds, tool results such as coin prices go stale
+MAX_BATCH_SIZE = 16  # prompts accepted in one ChatData.messages batch
+CRYPTO_WORKERS = 2
+# upper bounds on the encoded request fields, longer values are not decoded at all
+MAX_NONCE_CHARS = 128
+MAX_PUBLIC_KEY_CHARS = 1024  # a hex P-384 DER public key is 240 characters
+MAX_DATA_CHARS = 4 * 1024 * 1024
+MAX_FIELD_CHARS = {"nonce": MAX_NONCE_CHARS, "public_key": MAX_PUBLIC_KEY_CHARS, "data": MAX_DATA_CHARS}
+# raised once the MCP server subprocess has exited and its stdio streams are gone
+MCP_SESSION_ERRORS = (McpError, anyio.ClosedResourceError, anyio.BrokenResourceError, anyio.EndOfStream)
+MCP_SERVER_PARAMS = StdioServerParameters(
+    command="python",  # The command to run the server
+    args=[
+        str("mcp_server.py"),
+        "stdio",
+    ],  # Path to server script and transport mode
+)
+
+
+def api_key_digest(api_key: str) -> bytes:
+    # used as a cache key so the plaintext api key is not retained as a dict key
+    return hashlib.blake2b(api_key.encode(), digest_size=16).digest()
+
+
+def decode_field(value: str, encoding: str) -> bytes:
+    if encoding == "base64":
+        return base64.b64decode(value, validate=True)
+    return bytes.fromhex(value)
+
+
+def encode_field(value: bytes, encoding: str) -> str:
+    if encoding == "base64":
+        return base64.b64encode(value).decode()
+    return value.hex()
 
 
 class ChatRequest(BaseModel):
-    nonce: HexStr
-    public_key: HexStr
-    data: HexStr
+    nonce: bytes
+    public_key: bytes
+    data: bytes
+    # base64 is 33% larger than the raw bytes where hex is 100% larger;
+    # hex stays the default so existing clients keep working
+    encoding: Literal["hex", "base64"] = "hex"
+
+    @model_validator(mode="before")
+    @classmethod
+    def decode_fields(cls, values):
+        # Decode the text fields once while the request body is parsed. A field that
+        # does not decode becomes b"" and is rejected by APP.decrypt_chat_data on the
+        # same path as every other malformed request, instead of as an early 422
+        if isinstance(values, dict):
+            values = dict(values)
+            encoding = values.get("encoding", "hex")
+            for name, max_chars in MAX_FIELD_CHARS.items():
+                value = values.get(name)
+                if isinstance(value, str) and len(value) > max_chars:
+                    values[name] = b""
+                elif isinstance(value, str):
+                    try:
+                        values[name] = decode_field(value, encoding)
+                    except ValueError:
+                        values[name] = b""
+        return values
 
 
-@dataclasses.dataclass
+@dataclasses.dataclass(slots=True)
 class ChatData:
     api_key: str
-    message: str
+    message: str = ""
     platform: str = "openai"
     ai_model: str = "gpt-4"
+    # optional batch of prompts answered under a single decrypt and signature
+    messages: Optional[list] = None
 
-    def json(self):
-        return json.dumps(self, default=lambda o: o.__dict__)
+    def to_bytes(self) -> bytes:
+        # orjson serializes dataclasses natively, no asdict() deep copy
+        return orjson.dumps(self)
 
 
 class APP:
     app: FastAPI
     key: FixedKeyManager
+    session: ClientSession = None
+    mcp_task: asyncio.Task = None
+    http: httpx.AsyncClient = None
+    crypto_pool: ThreadPoolExecutor = None
     init: bool = False
+    pong_time: int = 0
+    pong_body: bytes = b""
 
     def __init__(self, vsock: bool=False):
         self.vsock = vsock
-        self.app = FastAPI()
+        self.app = FastAPI(default_response_class=ORJSONResponse)
         self.init_router()
+        self.app.add_event_handler("startup", self.connect)
+        self.app.add_event_handler("shutdown", self.disconnect)
         self.key = FixedKeyManager() if vsock else MockFixedKeyManager()
+        self.attestation_body = self.build_attestation_body()
+        self.exit_stack = AsyncExitStack()
+        self.mcp_lock = asyncio.Lock()
+        self.toolkit = None
+        self.llm_configs: OrderedDict[bytes, LLMConfig] = OrderedDict()
+        self.responses: OrderedDict[str, tuple] = OrderedDict()
+        self.pending: dict[str, asyncio.Task] = {}
+
+    async def connect(self):
+        # Spawn the MCP server once and share its session across all requests,
+        # instead of forking a new subprocess and handshaking on every /talk
+        await self.connect_mcp()
+
+        # shared client so outbound calls reuse pooled keep-alive connections
+        self.http = await self.exit_stack.enter_async_context(httpx.AsyncClient(
+            http2=True,
+            timeout=10.0,
+            limits=httpx.Limits(max_keepalive_connections=32),
+        ))
+
+        # ECDH/AES decrypt and ECDSA signing run here, off the event loop thread
+        self.crypto_pool = self.exit_stack.enter_context(
+            ThreadPoolExecutor(max_workers=CRYPTO_WORKERS, thread_name_prefix="crypto")
+        )
+
+    async def disconnect(self):
+        await self.close_mcp()
+        await self.exit_stack.aclose()
+        self.http = None
+        self.crypto_pool = None
+
+    async def connect_mcp(self):
+        # anyio requires the stdio client to be entered and exited in one task, so the
+        # session lives in its own task that close_mcp cancels
+        ready = asyncio.get_running_loop().create_future()
+        self.mcp_task = asyncio.create_task(self.serve_mcp(ready))
+        self.session = await ready
+        logger.info("MCP session initialized")
+
+    async def serve_mcp(self, ready: asyncio.Future):
+        try:
+            async with stdio_client(MCP_SERVER_PARAMS) as (read, write):
+                async with ClientSession(read, write) as session:
+                    await session.initialize()
+                    ready.set_result(session)
+                    await asyncio.Future()  # until close_mcp cancels this task
+        except Exception as e:
+            if not ready.done():
+                ready.set_exception(e)
+            raise
+
+    async def close_mcp(self):
+        task, self.mcp_task = self.mcp_task, None
+        self.session = None
+        # the toolkit's tools call into the session they were discovered on
+        self.toolkit = None
+        if task is not None:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+    async def reconnect_mcp(self, broken: Optional[ClientSession]) -> ClientSession:
+        # concurrent runs that saw the same broken session restart the server only once
+        async with self.mcp_lock:
+            if self.session is not None and self.session is not broken:
+                return self.session
+            logger.warning("MCP session lost, restarting the MCP server")
+            await self.close_mcp()
+            await self.connect_mcp()
+            return self.session
+
+    async def run_on_session(self, api_key: str, message: str):
+        # A dead MCP server would only show up as tool errors inside the agent run,
+        # so ping it first; a broken session is replaced and the run retried once
+        session = self.session
+        try:
+            if session is None:
+                raise anyio.ClosedResourceError()
+            await session.send_ping()
+            return await self.create_toolkit_and_run(session, api_key, message)
+        except MCP_SESSION_ERRORS as e:
+            logger.warning("MCP session failed: %r", e)
+        session = await self.reconnect_mcp(session)
+        return await self.create_toolkit_and_run(session, api_key, message)
+
+    def get_llm_config(self, api_key: str) -> LLMConfig:
+        # keep the most recently used configs; agents themselves are built per run,
+        # since a_run registers tools and appends to the agent's chat history
+        key = api_key_digest(api_key)
+        llm_config = self.llm_configs.get(key)
+        if llm_config is not None:
+            self.llm_configs.move_to_end(key)
+            return llm_config
+
+        llm_config = LLMConfig(model="gpt-4o-mini", api_type="openai",api_key=api_key)
+        self.llm_configs[key] = llm_config
+        if len(self.llm_configs) > LLM_CONFIG_CACHE_SIZE:
+            self.llm_configs.popitem(last=False)
+        return llm_config
+
+    async def cached_run(self, api_key: str, message: str):
+        key = hashlib.sha256(api_key_digest(api_key) + b"|" + message.encode()).hexdigest()
+        hit = self.responses.get(key)
+        if hit is not None and hit[1] > time.monotonic():
+            self.responses.move_to_end(key)
+            return hit[0]
+
+        # identical requests in flight share a single agent run
+        task = self.pending.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self.run_and_cache(key, api_key, message))
+            self.pending[key] = task
+            task.add_done_callback(lambda _: self.pending.pop(key, None))
+        return await asyncio.shield(task)
+
+    async def run_and_cache(self, key: str, api_key: str, message: str):
+        result = await self.run_on_session(api_key, message)
+        messages = await result.messages
+
+        self.responses[key] = (messages, time.monotonic() + RESPONSE_CACHE_TTL)
+        if len(self.responses) > RESPONSE_CACHE_SIZE:
+            self.responses.popitem(last=False)
+        return messages
 
     def init_router(self):
-        self.app.add_api_route("/ping", self.ping, methods=["GET"])
+        # plain Starlette route, ping needs no FastAPI parameter parsing or validation
+        self.app.add_route("/ping", self.ping, methods=["GET"])
         self.app.add_api_route("/attestation", self.attestation, methods=["GET"])
         self.app.add_api_route("/query", self.test_query, methods=["GET"])
         self.app.add_api_route("/talk", self.talk_to_ai, methods=["POST"])
 
-    @staticmethod
-    def ping(request: Request):
-        return {"pong": int(time.time())}
+    async def ping(self, request: Request):
+        # health checks are the hottest route, so the body is rebuilt at most once a second
+        now = int(time.time())
+        if now != self.pong_time:
+            self.pong_time = now
+            self.pong_body = b'{"pong":%d}' % now
+        return Response(self.pong_body, media_type="application/json")
 
-    async def attestation(self, request: Request):
+    def build_attestation_body(self) -> bytes:
+        # The attestation document is fixed for the process lifetime, so serialize it once
         if self.vsock:
-            return JSONResponse({
+            return orjson.dumps({
                 "attestation_doc": self.key.fixed_document
             })
         else:
-            return JSONResponse({
+            return orjson.dumps({
                 "attestation_doc": self.key.fixed_document,
                 "mock": True
             })
+
+    async def attestation(self, request: Request):
+        return Response(self.attestation_body, media_type="application/json")
     
     async def create_toolkit_and_run(self, session: ClientSession, api_key: str, message: str):
-        toolkit = await create_toolkit(session=session)
-        agent = AssistantAgent(name="assistant", llm_config=LLMConfig(model="gpt-4o-mini", api_type="openai",api_key=api_key))
+        # the tool list is fixed for the lifetime of the session, so discover it only once
+        if self.toolkit is None:
+            self.toolkit = await create_toolkit(session=session)
+        # a fresh agent per run, so no history or tool registration is shared between requests
+        agent = AssistantAgent(name="assistant", llm_config=self.get_llm_config(api_key))
 
         # Make a request using the MCP tool
         result = await agent.a_run(
             message=message,
-            tools=toolkit.tools,
+            tools=self.toolkit.tools,
             max_turns=2,
             user_input=False,
         )
         await result.process()
         return result
 
+    async def run_crypto(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.crypto_pool, func, *args)
+
+    async def decrypt_chat_data(self, req: ChatRequest) -> Optional[ChatData]:
+        # Every malformed request runs the same decrypt and ends in the same result,
+        # so response timing does not reveal which validation step failed. The caller's
+        # public key is kept whenever there is one, so the AES key cache hits or misses
+        # for a malformed request exactly as it would for a well-formed one
+        nonce, public_key, data = req.nonce, req.public_key, req.data
+        err = 0
+        err |= len(nonce) < 8
+        err |= not public_key
+        err |= not data
+        if err:
+            # dummy inputs that still run the key derivation and then fail the AES-GCM tag check
+            nonce, data = bytes(12), bytes(16)
+            if not public_key:
+                public_key = self.key.get_public_key_der()
+
+        try:
+            raw_data = await self.run_crypto(self.key.decrypt, public_key, nonce, data)
+            chat_data = ChatData(**orjson.loads(raw_data))
+        except Exception:
+            chat_data = ChatData(api_key="", message="", ai_model="")
+            err |= 1
+        err |= not chat_data.api_key
+        err |= not chat_data.ai_model
+        if chat_data.messages is None:
+            err |= not chat_data.message
+        else:
+            batch = chat_data.messages if isinstance(chat_data.messages, list) else []
+            err |= not 0 < len(batch) <= MAX_BATCH_SIZE
+            err |= not all(isinstance(m, str) for m in batch)
+        return None if err else chat_data
+
     async def talk_to_ai(self, req: ChatRequest):
-        nonce = bytes.fromhex(req.nonce)
-        if len(nonce) < 8:
-            return JSONResponse({"error": "invalid nonce, must be at least 8 characters long"})
-
-        public_key = bytes.fromhex(req.public_key)
-        data = bytes.fromhex(req.data)
-
-        raw_data = self.key.decrypt(public_key, nonce, data)
-        chat_data = ChatData(**json.loads(raw_data))
-        if chat_data.api_key == "":
-            return JSONResponse({"error": "empty api_key"})
-        elif chat_data.ai_model == "":
-            return JSONResponse({"error": "empty ai_model"})
-        
-        # Create server parameters for stdio connection
-        server_params = StdioServerParameters(
-            command="python",  # The command to run the server
-            args=[
-                str("mcp_server.py"),
-                "stdio",
-            ],  # Path to server script and transport mode
-        )
+        chat_data = await self.decrypt_chat_data(req)
+        if chat_data is None:
+            return ORJSONResponse({"error": "invalid request"})
 
-        async with stdio_client(server_params) as (read, write), ClientSession(read, write) as session:
-        # Initialize the connection
-            await session.initialize()
-        
-            # set up tools and agent
-            result = await self.create_toolkit_and_run(session, chat_data.api_key, chat_data.message)
-        
-        messages = await result.messages
+        # set up tools and agent on the persistent MCP session, or reuse a recent answer
+        if chat_data.messages is not None:
+            # a batch shares one decrypt and one signature; the prompts run concurrently,
+            # each on its own agent (see create_toolkit_and_run), so no chat state is shared
+            messages = list(await asyncio.gather(*(
+                self.cached_run(chat_data.api_key, message) for message in chat_data.messages
+            )))
+        else:
+            messages = await self.cached_run(chat_data.api_key, chat_data.message)
         logger.info(messages)
 
-        return self.response(messages)
+        return await self.response(messages, req.encoding)
 
     async def test_query(self, request: Request):
-        data = requests.get("https://api.binance.com/api/v3/time").json()
-        return self.response(data)
+        resp = await self.http.get("https://api.binance.com/api/v3/time")
+        data = resp.json()
+        return await self.response(data)
 
-    def response(self, data):
-        return JSONResponse({
-            "sig": self.key.sign(data).hex(),
+    async def response(self, data, encoding: str = "hex"):
+        sig = await self.run_crypto(self.key.sign, data)
+        return ORJSONResponse({
+            "sig": encode_field(sig, encoding),
             "data": data,
         })
 
@@ -144,4 +375,4 @@ if __name__ == "__main__":
     s = Server(ENCLAVE_SERVER_PORT, vsock=args.vsock)
 
     fd = s.fileno()
-    uvicorn.run(app.app, fd=fd)
+    uvicorn.run(app.app, fd=fd, loop="uvloop", http="httptools", log_level="warning")
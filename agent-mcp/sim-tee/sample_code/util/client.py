@@ -10,9 +10,14 @@ class Client(abc.ABC):
         raise NotImplementedError()
 
     @abc.abstractmethod
-    def async_connect(self):
+    def async_connect_socket(self):
         raise NotImplementedError()
 
+    async def async_connect(self):
+        sock = await self.async_connect_socket()
+        # reader / writer
+        return await asyncio.open_connection(sock=sock)
+
 
 class VSockClient(Client):
     cid: int
@@ -27,7 +32,7 @@ class VSockClient(Client):
         host_conn.connect((self.cid, self.port))
         return host_conn
 
-    async def async_connect(self):
+    async def async_connect_socket(self):
         loop = asyncio.get_running_loop()
         sock = socket.socket(socket.AF_VSOCK, socket.SOCK_STREAM)
         sock.setblocking(False)
@@ -54,7 +59,7 @@ class VSockClient(Client):
         if err != 0:
             raise OSError(err, os.strerror(err))
 
-        return await asyncio.open_connection(sock=sock)
+        return sock
 
 
 HOST_CID = 2 # socket.VMADDR_CID_HOST
@@ -74,14 +79,21 @@ class TCPClient(Client):
         self.port = port
 
     def connect(self):
-        host_conn = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        host_conn.connect((self.host, self.port))
-        return host_conn
+        return socket.create_connection((self.host, self.port))
 
-    async def async_connect(self):
+    async def async_connect_socket(self):
+        # resolve like socket.create_connection and try each address in turn,
+        # so hosts that are only reachable over IPv6 work as well
         loop = asyncio.get_running_loop()
-        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        sock.setblocking(False)
-        await loop.sock_connect(sock, (self.host, self.port))
-        # reader / writer
-        return await asyncio.open_connection(sock=sock)
+        infos = await loop.getaddrinfo(self.host, self.port, type=socket.SOCK_STREAM)
+        error = None
+        for family, sock_type, proto, _, addr in infos:
+            sock = socket.socket(family, sock_type, proto)
+            sock.setblocking(False)
+            try:
+                await loop.sock_connect(sock, addr)
+                return sock
+            except OSError as e:
+                sock.close()
+                error = e
+        raise error or OSError(f"no addresses found for {self.host}")
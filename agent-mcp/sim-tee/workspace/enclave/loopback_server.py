@@ -1,5 +1,6 @@
 import argparse
 import asyncio
+import socket
 
 from util.client import Client
 from util.client import TCPClient
@@ -13,6 +14,12 @@ class LoopbackHandler(Handler):
     def __init__(self, client_generator: Client):
         self.client_generator = client_generator
 
+    async def handle_socket(self, sock: socket.socket):
+        # plain TCP forwarding, so relay between the raw sockets instead of through streams
+        with sock:
+            client_sock = await self.client_generator.async_connect_socket()
+            await self.relay(sock, client_sock)
+
     async def handle_connection(self, reader, writer):
         client_reader, client_writer = await self.client_generator.async_connect()
         await asyncio.gather(
@@ -1,5 +1,6 @@
 import argparse
 import os
+import sys
 import signal
 import multiprocessing
 from multiprocessing import Process
@@ -13,12 +14,41 @@ from util.server import Server, ENCLAVE_SERVER_PORT, HOST_PROXY_SERVER_PORT
 from util.log import logger
 
 
-def run_app(vsock):
-    app = APP(vsock)
+MAX_APP_WORKERS = 4
+
+
+class AppServer(Server):
+    """
+    Supervises the uvicorn workers of the enclave app the same way Server supervises
+    its handler workers: crashed workers are reaped and restarted, and SIGINT/SIGTERM
+    stop all of them. Workers are forked rather than spawned, so each one inherits
+    the listening socket and the APP whose key pair the attestation document reports.
+    """
+
+    def __init__(self, app: APP, workers: int, vsock=False):
+        super().__init__(ENCLAVE_SERVER_PORT, vsock=vsock)
+        self.app = app
+        self.process_num = workers
+
+    def start_one_worker(self):
+        p = multiprocessing.get_context("fork").Process(target=self.serve, daemon=True)
+        p.start()
+        logger.info(f"app worker {p.pid} started.")
+        self.processes.append(p)
 
-    s = Server(ENCLAVE_SERVER_PORT, vsock=vsock)
-    fd = s.fileno()
-    uvicorn.run(app.app, fd=fd)
+    def serve(self):
+        # drop the supervisor's handlers inherited through fork, uvicorn installs its own
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        uvicorn.run(self.app.app, fd=self.fileno(), loop="uvloop", http="httptools", log_level="warning")
+
+
+def run_app(vsock, workers=1):
+    # The key pair and attestation document are created here, before forking,
+    # so every worker decrypts and signs with the key the attestation reports.
+    # Per-worker state such as connections is set up by each worker on startup
+    app = APP(vsock)
+    AppServer(app, workers, vsock=vsock).start()
 
 
 def run_loopback_server(vsock):
@@ -35,33 +65,39 @@ def run_loopback_server(vsock):
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument("--vsock", action="store_true", help="Enable vsock mode (optional)")
+    parser.add_argument("--workers", type=int, default=min(os.cpu_count() or 1, MAX_APP_WORKERS), help="Number of app worker processes sharing the listening socket (optional)")
+    parser.add_argument("--no-loopback", action="store_true", help="Skip the Python loopback server, e.g. when nginx relays port 443 (optional)")
     args = parser.parse_args()
 
-    p1 = Process(target=run_app, args=(args.vsock,))
-    p2 = Process(target=run_loopback_server, args=(args.vsock,))
+    processes = [Process(target=run_app, args=(args.vsock, args.workers))]
+    if not args.no_loopback:
+        processes.append(Process(target=run_loopback_server, args=(args.vsock,)))
 
-    p1.start()
-    p2.start()
+    for p in processes:
+        p.start()
 
     try:
-        p1.join()
-        p2.join()
+        for p in processes:
+            p.join()
     except KeyboardInterrupt:
         logger.info("caught Ctrl+C, shutting down...")
-        try:
-            os.killpg(p1.pid, signal.SIGTERM)
-        except Exception as e:
-            logger.error("failed to kill p1 group, %s", e)
-        try:
-            os.killpg(p2.pid, signal.SIGTERM)
-        except Exception as e:
-            logger.error("failed to kill p2 group, %s", e)
-
-        p1.join()
-        p2.join()
+        for p in processes:
+            try:
+                os.killpg(p.pid, signal.SIGTERM)
+            except Exception as e:
+                logger.error("failed to kill process group %s, %s", p.pid, e)
+
+        for p in processes:
+            p.join()
         logger.info("all servers shutdown cleanly.")
 
 
 if __name__ == '__main__':
-    multiprocessing.set_start_method('spawn')  # for Windows / Mac / Linux
+    if sys.platform == "linux":
+        # fork the servers from a forkserver that has already imported them,
+        # instead of re-importing everything in each spawned child
+        multiprocessing.set_start_method('forkserver')
+        multiprocessing.set_forkserver_preload(["app", "loopback_server", "util.server", "util.client"])
+    else:
+        multiprocessing.set_start_method('spawn')  # for Windows / Mac
     main()
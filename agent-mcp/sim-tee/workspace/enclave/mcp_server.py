@@ -1,11 +1,22 @@
 import argparse
+import time
+from collections import OrderedDict
 from datetime import datetime
 
+import httpx
 from mcp.server.fastmcp import FastMCP
-from binance.client import Client
 
 
 mcp = FastMCP("McpServer")
+# FastMCP runs sync tools on its event loop, and every /talk request shares this
+# server's stdio session, so the price lookup has to be async to not stall the others
+http_client = httpx.AsyncClient(base_url="https://api.binance.com", http2=True, timeout=10.0)
+
+# symbol -> (price, expiry), agents often ask for the same ticker several times in one run.
+# Entries are kept in expiry order, so expired ones are dropped from the front
+PRICE_CACHE_TTL = 5.0
+PRICE_CACHE_SIZE = 256  # symbols come from the LLM, so bound the number kept
+price_cache: OrderedDict[str, tuple[float, float]] = OrderedDict()
 
 
 @mcp.tool()
@@ -34,12 +45,24 @@ def get_current_date() -> str:
 
 
 @mcp.tool()
-def get_coin_price(symbol: str) -> float:
+async def get_coin_price(symbol: str) -> float:
     """Get the price of a coin by ticker symbol. Default denominator is USDT."""
-    client = Client()
+    now = time.monotonic()
+    hit = price_cache.get(symbol)
+    if hit is not None and hit[1] > now:
+        return hit[0]
+
     symbol_usdt = symbol + "USDT"
-    price = client.get_symbol_ticker(symbol=symbol_usdt)
-    return float(price["price"])
+    resp = await http_client.get("/api/v3/ticker/price", params={"symbol": symbol_usdt})
+    resp.raise_for_status()
+    price = float(resp.json()["price"])
+    price_cache[symbol] = (price, now + PRICE_CACHE_TTL)
+    price_cache.move_to_end(symbol)
+    while price_cache and next(iter(price_cache.values()))[1] <= now:
+        price_cache.popitem(last=False)
+    if len(price_cache) > PRICE_CACHE_SIZE:
+        price_cache.popitem(last=False)
+    return price
 
 
 files = {
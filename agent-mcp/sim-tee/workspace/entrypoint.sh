@@ -9,8 +9,16 @@ if [ "$LOCAL" = "true" ]; then
 
     dnsmasq
 
-    echo "start app"
-    python /app/main.py
+    if [ "$LOOPBACK" = "nginx" ]; then
+        echo "start nginx loopback proxy"
+        nginx -c /app/nginx/loopback.conf
+
+        echo "start app"
+        python /app/main.py --no-loopback
+    else
+        echo "start app"
+        python /app/main.py
+    fi
 else
     echo "MODE: TEE"
 
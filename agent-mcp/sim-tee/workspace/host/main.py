@@ -1,5 +1,6 @@
 import argparse
 import os
+import sys
 import signal
 import multiprocessing
 from multiprocessing import Process
@@ -52,5 +53,11 @@ def main():
 
 
 if __name__ == '__main__':
-    multiprocessing.set_start_method('spawn')  # for Windows / Mac / Linux
+    if sys.platform == "linux":
+        # fork the servers from a forkserver that has already imported them,
+        # instead of re-importing everything in each spawned child
+        multiprocessing.set_start_method('forkserver')
+        multiprocessing.set_forkserver_preload(["host_server", "host_proxy", "util.server", "util.client"])
+    else:
+        multiprocessing.set_start_method('spawn')  # for Windows / Mac
     main()
@@ -1,18 +1,28 @@
 import os
 import json
 import re
+import asyncio
 
+import httpx
 import requests
 
 from util.signer import Signer
 from util.verifier import Verifier
 
+# Simple regex for URLs (can be improved), compiled once at import
+URL_PATTERN = re.compile(r'https?://[^\s,]+')
+# max number of /talk requests in flight to the TEE
+TEE_CONCURRENCY = 8
+# only this much of each page is sent to the TEE for summarizing
+MAX_CONTENT_CHARS = 10_000
+
 
 class ClientRequest:
     tee_endpoint: str
     public_key: str = ""
     api_key: str
     att: dict
+    session: requests.Session
 
     def __init__(self, tee_endpoint: str = "http://127.0.0.1:8000"):
         self.api_key = os.getenv("PLATFORM_API_KEY")
@@ -21,6 +31,8 @@ class ClientRequest:
         if not self.api_key:
             raise Exception('API key is required')
         self.tee_endpoint = tee_endpoint
+        # the attestation fetch runs before any event loop, chat() pools its own httpx client
+        self.session = requests.Session()
         self.signer = Signer()
         self.init_keys()
 
@@ -30,7 +42,7 @@ class ClientRequest:
         self.public_key = self.att["public_key"].hex()
 
     def verify_attestation(self) -> bool:
-        att = requests.get(f"{self.tee_endpoint}/attestation").json()
+        att = self.session.get(f"{self.tee_endpoint}/attestation").json()
         if att.get("mock"):
             self.att = {
                 "public_key": bytes.fromhex(att["attestation_doc"]["public_key"]),
@@ -45,97 +57,83 @@ class ClientRequest:
             return result
 
     def extract_urls(self, text):
-        # Simple regex for URLs (can be improved)
-        url_pattern = r'https?://[^\s,]+'
-        return re.findall(url_pattern, text)
+        return URL_PATTERN.findall(text)
 
-    def fetch_url_content(self, url):
+    async def fetch_url_content(self, http: httpx.AsyncClient, url):
         try:
-            resp = requests.get(url, timeout=10)
+            resp = await http.get(url)
             resp.raise_for_status()
-            return resp.text
+            return resp.text[:MAX_CONTENT_CHARS]
         except Exception as e:
             print(f"Failed to fetch {url}: {e}")
             return ""
 
-    def chat(self, message: str):
-        # 1. Ask TEE for URLs that can answer the user's prompt
-        url_prompt = (
-            f"List 5 exact URLs (no explanations, just the URLs, one per line) "
-            f"that would help answer the following question:\n\n{message}\n"
-        )
+    def build_request(self, message: str) -> dict:
         data = {
             "api_key": self.api_key,
-            "message": url_prompt,
+            "message": message,
             "platform": self.platform,
             "ai_model": self.model,
         }
         nonce = os.urandom(32)
-        req = {
+        return {
             "nonce": nonce.hex(),
             "public_key": self.signer.get_public_key_der().hex(),
             "data": self.signer.encrypt(bytes.fromhex(self.public_key), nonce, json.dumps(data).encode()).hex()
         }
-        url_resp = requests.post(f"{self.tee_endpoint}/talk", json=req).json()
-        print("\nStep 1: URL response:", url_resp)
-        url_text = url_resp["data"]["response"]
-        urls = self.extract_urls(url_text)
-        print("Extracted URLs:", urls)
-
-        # 2. Fetch content for each URL
-        url_contents = {}
-        for url in urls:
-            print(f"\nFetching content for: {url}")
-            url_contents[url] = self.fetch_url_content(url)
-
-        # 3. Summarize each URL's content via TEE
-        summaries = {}
-        for url, content in url_contents.items():
-            if not content.strip():
-                summaries[url] = "[No content fetched]"
-                continue
-            summary_prompt = (
-                f"Given the original question:\n{message}\n\n"
-                f"Summarize the following content from {url} in a way that is relevant to the question:\n\n{content[:10000]}"
+
+    async def talk(self, http: httpx.AsyncClient, sem: asyncio.Semaphore, message: str) -> dict:
+        # the semaphore bounds how many /talk calls hit the TEE at once
+        async with sem:
+            resp = await http.post(f"{self.tee_endpoint}/talk", json=self.build_request(message), timeout=None)
+        return resp.json()
+
+    async def chat(self, message: str):
+        sem = asyncio.Semaphore(TEE_CONCURRENCY)
+        async with httpx.AsyncClient(timeout=10, follow_redirects=True) as http:
+            # 1. Ask TEE for URLs that can answer the user's prompt
+            url_prompt = (
+                f"List 5 exact URLs (no explanations, just the URLs, one per line) "
+                f"that would help answer the following question:\n\n{message}\n"
             )
-            data = {
-                "api_key": self.api_key,
-                "message": summary_prompt,
-                "platform": self.platform,
-                "ai_model": self.model,
-            }
-            nonce = os.urandom(32)
-            req = {
-                "nonce": nonce.hex(),
-                "public_key": self.signer.get_public_key_der().hex(),
-                "data": self.signer.encrypt(bytes.fromhex(self.public_key), nonce, json.dumps(data).encode()).hex()
-            }
-            summary_resp = requests.post(f"{self.tee_endpoint}/talk", json=req).json()
-            print(f"\nSummary for {url}:", summary_resp)
-            summaries[url] = summary_resp["data"]["response"]
+            url_resp = await self.talk(http, sem, url_prompt)
+            print("\nStep 1: URL response:", url_resp)
+            url_text = url_resp["data"]["response"]
+            urls = list(dict.fromkeys(self.extract_urls(url_text)))
+            print("Extracted URLs:", urls)
 
-        # 4. Final summary: ask TEE to synthesize all summaries into a final answer
-        combined_summaries = "\n\n".join(
-            f"URL: {url}\nSummary: {summary}" for url, summary in summaries.items()
-        )
-        final_prompt = (
-            f"Given the original question:\n{message}\n\n"
-            f"and the following summaries from various sources:\n\n{combined_summaries}\n\n"
-            f"Provide a concise, well-sourced answer to the original question."
-        )
-        data = {
-            "api_key": self.api_key,
-            "message": final_prompt,
-            "platform": self.platform,
-            "ai_model": self.model,
-        }
-        nonce = os.urandom(32)
-        req = {
-            "nonce": nonce.hex(),
-            "public_key": self.signer.get_public_key_der().hex(),
-            "data": self.signer.encrypt(bytes.fromhex(self.public_key), nonce, json.dumps(data).encode()).hex()
-        }
-        final_resp = requests.post(f"{self.tee_endpoint}/talk", json=req).json()
+            # 2. Fetch content for all URLs concurrently
+            print("\nFetching content for:", urls)
+            contents = await asyncio.gather(*(self.fetch_url_content(http, url) for url in urls))
+            url_contents = dict(zip(urls, contents))
+
+            # 3. Summarize each URL's content via TEE concurrently
+            summaries = {}
+            pending = {}
+            for url, content in url_contents.items():
+                if not content.strip():
+                    summaries[url] = "[No content fetched]"
+                    continue
+                summary_prompt = (
+                    f"Given the original question:\n{message}\n\n"
+                    f"Summarize the following content from {url} in a way that is relevant to the question:\n\n{content}"
+                )
+                pending[url] = self.talk(http, sem, summary_prompt)
+            summary_resps = await asyncio.gather(*pending.values())
+            for url, summary_resp in zip(pending, summary_resps):
+                print(f"\nSummary for {url}:", summary_resp)
+                summaries[url] = summary_resp["data"]["response"]
+
+            # 4. Final summary: ask TEE to synthesize all summaries into a final answer
+            combined_summaries = "\n\n".join(
+                f"URL: {url}\nSummary: {summaries[url]}" for url in urls
+            )
+            final_prompt = (
+                f"Given the original question:\n{message}\n\n"
+                f"and the following summaries from various sources:\n\n{combined_summaries}\n\n"
+                f"Provide a concise, well-sourced answer to the original question."
+            )
+            final_resp = await self.talk(http, sem, final_prompt)
         print("\nFinal synthesized answer:", final_resp["data"]["response"])
         print("verify signature:", self.verify_sig(final_resp["data"], final_resp["sig"]))
 
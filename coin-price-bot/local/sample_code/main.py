@@ -1,4 +1,5 @@
 import os
+import asyncio
 
 from client import ClientRequest
 
@@ -9,8 +10,8 @@ if __name__ == '__main__':
     client = ClientRequest(tee_endpoint=tee_endpoint)
 
     # Example usage with token query agent
-    client.chat("Bitcoin Price today right now")
+    asyncio.run(client.chat("Bitcoin Price today right now"))
 
     # Example usage with general chat agent
-    # client.chat("Hello")
-    # client.chat("What's the date today")
+    # asyncio.run(client.chat("Hello"))
+    # asyncio.run(client.chat("What's the date today"))
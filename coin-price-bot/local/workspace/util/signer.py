@@ -1,5 +1,6 @@
 import json
 import os
+import threading
 from typing import Union
 
 from cryptography.hazmat.primitives.asymmetric import ec
@@ -8,6 +9,9 @@ from cryptography.hazmat.primitives import hashes, serialization
 from cryptography.hazmat.primitives.ciphers.aead import AESGCM
 
 
+AES_KEY_CACHE_SIZE = 256
+
+
 class Signer:
     def __init__(self, private_key: ec.EllipticCurvePrivateKey = None, public_key: ec.EllipticCurvePublicKey = None):
         if private_key is None:
@@ -16,6 +20,9 @@ class Signer:
         else:
             self.private_key = private_key
             self.public_key = public_key
+        self.aes_keys = {}
+        # crypto may run on several worker threads, guard the cache's check-and-evict
+        self.aes_keys_lock = threading.Lock()
 
     def get_public_key_der(self) -> bytes:
         return self.public_key.public_bytes(
@@ -58,7 +65,17 @@ class Signer:
             ec.ECDSA(hashes.SHA384())
         )
 
-    def encrypt(self, public_key: bytes, nonce: bytes, message: bytes) -> bytes:
+    def derive_aes_key(self, public_key: bytes) -> bytes:
+        """
+        Derive the AES-256 key shared with a peer (ECDH exchange + HKDF-SHA256).
+        Peers keep one key pair per session, so the result is cached per peer public key
+        and the scalar multiplication is paid once instead of on every message.
+        """
+        with self.aes_keys_lock:
+            aes_key = self.aes_keys.get(public_key)
+        if aes_key is not None:
+            return aes_key
+
         shared_key = self.private_key.exchange(ec.ECDH(), serialization.load_der_public_key(public_key))
         aes_key = HKDF(
             algorithm=hashes.SHA256(),
@@ -66,19 +83,17 @@ class Signer:
             salt=None,
             info=b"encryption data"
         ).derive(shared_key)
-        return AESGCM(aes_key).encrypt(nonce, message, None)
+        with self.aes_keys_lock:
+            if len(self.aes_keys) >= AES_KEY_CACHE_SIZE:
+                self.aes_keys.pop(next(iter(self.aes_keys)), None)
+            self.aes_keys[public_key] = aes_key
+        return aes_key
+
+    def encrypt(self, public_key: bytes, nonce: bytes, message: bytes) -> bytes:
+        return AESGCM(self.derive_aes_key(public_key)).encrypt(nonce, message, None)
 
     def decrypt(self, public_key: bytes, nonce: bytes, data: bytes) -> bytes:
-        # ECDH exchange key
-        shared_key = self.private_key.exchange(ec.ECDH(), serialization.load_der_public_key(public_key))
-        # derive AES key
-        aes_key = HKDF(
-            algorithm=hashes.SHA256(),
-            length=32,
-            salt=None,
-            info=b"encryption data"
-        ).derive(shared_key)
-        return AESGCM(aes_key).decrypt(nonce, data, associated_data=None)
+        return AESGCM(self.derive_aes_key(public_key)).decrypt(nonce, data, associated_data=None)
 
 
 if __name__ == '__main__':
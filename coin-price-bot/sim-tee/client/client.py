@@ -12,6 +12,7 @@ class ClientRequest:
     public_key: str = ""
     api_key: str
     att: dict
+    session: requests.Session
 
     def __init__(self, tee_endpoint: str = "http://127.0.0.1:8000"):
         self.api_key = os.getenv("PLATFORM_API_KEY")
@@ -20,6 +21,8 @@ class ClientRequest:
         if not self.api_key:
             raise Exception('API key is required')
         self.tee_endpoint = tee_endpoint
+        # one keep-alive connection serves the attestation fetch and every chat call
+        self.session = requests.Session()
         self.signer = Signer()
         self.init_keys()
 
@@ -29,7 +32,7 @@ class ClientRequest:
         self.public_key = self.att["public_key"].hex()
 
     def verify_attestation(self) -> bool:
-        att = requests.get(f"{self.tee_endpoint}/attestation").json()
+        att = self.session.get(f"{self.tee_endpoint}/attestation").json()
         if att.get("mock"):
             self.att = {
                 "public_key": bytes.fromhex(att["attestation_doc"]["public_key"]),
@@ -58,7 +61,7 @@ class ClientRequest:
             "public_key": self.signer.get_public_key_der().hex(),
             "data": self.signer.encrypt(bytes.fromhex(self.public_key), nonce, json.dumps(data).encode()).hex()
         }
-        resp = requests.post(f"{self.tee_endpoint}/talk", json=req).json()
+        resp = self.session.post(f"{self.tee_endpoint}/talk", json=req).json()
 
         print()
         print('prompt:', message)
@@ -1,8 +1,12 @@
 import logging
+import os
 import sys
 
 logger = logging.getLogger("myproxy")
-logger.setLevel(logging.DEBUG)
+# INFO by default, LOG_LEVEL=DEBUG also logs full request/response payloads.
+# An unknown level name falls back to INFO instead of failing at import
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+logger.setLevel(LOG_LEVEL if isinstance(logging.getLevelName(LOG_LEVEL), int) else logging.INFO)
 handler = logging.StreamHandler(sys.stdout)
 handler.setFormatter(logging.Formatter('[%(asctime)s] %(levelname)s %(message)s'))
 logger.addHandler(handler)
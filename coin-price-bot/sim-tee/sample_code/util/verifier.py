@@ -1,5 +1,6 @@
 import json
 import base64
+import functools
 from typing import Union
 
 import cbor2
@@ -22,12 +23,19 @@ class Verifier:
             return obj.hex()
         return str(obj)
 
+    @staticmethod
+    @functools.lru_cache(maxsize=16)
+    def load_public_key(pub_key: bytes):
+        # peers sign with a fixed key, so each DER key is parsed only once
+        return serialization.load_der_public_key(pub_key, backend=default_backend())
+
     @staticmethod
     def verify_signature(pub_key: bytes, msg: Union[bytes, str, dict], signature: bytes) -> bool:
-        pub_key = serialization.load_der_public_key(pub_key, backend=default_backend())
+        pub_key = Verifier.load_public_key(pub_key)
         if isinstance(msg, str):
             msg = msg.encode()
         elif isinstance(msg, dict) or isinstance(msg, list):
+            # canonical form must match the signer byte for byte (ASCII-escaped, sorted keys)
             msg = json.dumps(msg, separators=(',', ':'), sort_keys=True).encode()
         elif not isinstance(msg, bytes):
             raise TypeError("Message must be str, dict or bytes")
@@ -0,0 +1,35 @@
+import os
+import sys
+import unittest
+
+SAMPLE_CODE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "sample_code")
+sys.path[:0] = [SAMPLE_CODE, os.path.join(SAMPLE_CODE, "enclave")]
+
+try:
+    from utils import extract_urls
+except ImportError as e:
+    raise unittest.SkipTest(f"enclave requirements are not installed: {e}")
+
+
+class ExtractUrlsTest(unittest.TestCase):
+    def test_keeps_balanced_parentheses(self):
+        self.assertEqual(
+            extract_urls("see https://en.wikipedia.org/wiki/Bitcoin_(currency)."),
+            ["https://en.wikipedia.org/wiki/Bitcoin_(currency)"],
+        )
+
+    def test_strips_unmatched_closing_brackets(self):
+        self.assertEqual(
+            extract_urls("(https://x.com/a) [docs](https://x.com/b_(c)) <https://y.com/>,"),
+            ["https://x.com/a", "https://x.com/b_(c)", "https://y.com/"],
+        )
+
+    def test_strips_trailing_punctuation(self):
+        self.assertEqual(
+            extract_urls("https://x.com/a.\nhttps://x.com/b?q=1!"),
+            ["https://x.com/a", "https://x.com/b?q=1"],
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
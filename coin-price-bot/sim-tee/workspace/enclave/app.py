@@ -1,30 +1,63 @@
-import json
 import argparse
+import base64
+import hashlib
 import time
+import asyncio
 import dataclasses
 import os
+import ssl
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Literal
 
-import requests
+import httpx
+import orjson
 import uvicorn
 from fastapi import FastAPI, Request
-from fastapi.responses import JSONResponse
-from pydantic import BaseModel
+from fastapi.responses import ORJSONResponse, Response
+from pydantic import BaseModel, Field
 
 from attestation import FixedKeyManager, MockFixedKeyManager
 from util.server import Server, ENCLAVE_SERVER_PORT
 from util.log import logger
 from util.verifier import Verifier
 from util.sign import Signer
-from utils import url_prompt, extract_urls, custom_get, custom_post, fetch_html, summary_prompt, final_summary_prompt
+from utils import url_prompt, extract_urls, custom_get, custom_post, fetch_html, summary_prompt, final_summary_prompt, CERT_PATH, REQUEST_TIMEOUT, HTTP_LIMITS
+
+
+RESPONSE_CACHE_SIZE = 1024
+RESPONSE_CACHE_TTL = 60  # seconds, coin prices and the pages behind them go stale
+MAX_URLS = 3  # distinct pages fetched and summarized per question
+CRYPTO_WORKERS = 2
+# upper bounds on the encoded request fields, checked before anything is decoded
+MAX_NONCE_CHARS = 128
+MAX_PUBLIC_KEY_CHARS = 1024  # a hex P-384 DER public key is 240 characters
+MAX_DATA_CHARS = 4 * 1024 * 1024
 
 
 HexStr = str
 
 
+def decode_field(value: str, encoding: str) -> bytes:
+    if encoding == "base64":
+        return base64.b64decode(value, validate=True)
+    return bytes.fromhex(value)
+
+
+def encode_field(value: bytes, encoding: str) -> str:
+    if encoding == "base64":
+        return base64.b64encode(value).decode()
+    return value.hex()
+
+
 class ChatRequest(BaseModel):
-    nonce: HexStr
-    public_key: HexStr
-    data: HexStr
+    # oversized or obviously short fields are rejected while the body is parsed
+    nonce: HexStr = Field(min_length=12, max_length=MAX_NONCE_CHARS)
+    public_key: HexStr = Field(min_length=1, max_length=MAX_PUBLIC_KEY_CHARS)
+    data: HexStr = Field(min_length=1, max_length=MAX_DATA_CHARS)
+    # base64 is 33% larger than the raw bytes where hex is 100% larger;
+    # hex stays the default so existing clients keep working
+    encoding: Literal["hex", "base64"] = "hex"
 
 
 @dataclasses.dataclass
@@ -34,39 +67,73 @@ class ChatData:
     platform: str = "openai"
     ai_model: str = "gpt-4"
 
-    def json(self):
-        return json.dumps(self, default=lambda o: o.__dict__)
+    def to_bytes(self) -> bytes:
+        # orjson serializes dataclasses natively, no asdict() deep copy
+        return orjson.dumps(self)
 
 
 class APP:
     app: FastAPI
     key: FixedKeyManager
+    # sparsity endpoint (custom CA bundle) and arbitrary web pages, opened on startup
+    sparsity_ssl: ssl.SSLContext = None
+    sparsity_http: httpx.AsyncClient = None
+    web_http: httpx.AsyncClient = None
+    crypto_pool: ThreadPoolExecutor = None
     init: bool = False
+    pong_time: int = 0
+    pong_body: bytes = b""
 
     def __init__(self, vsock: bool=False):
         self.vsock = vsock
-        self.app = FastAPI()
+        self.app = FastAPI(default_response_class=ORJSONResponse)
         self.init_router()
+        self.app.add_event_handler("startup", self.connect)
+        self.app.add_event_handler("shutdown", self.disconnect)
         self.key = FixedKeyManager() if vsock else MockFixedKeyManager()
         self.sparsity_endpoint = os.getenv("SPARSITY_ENDPOINT", "https://tee-app-2090887810.ap-northeast-2.elb.amazonaws.com")
         self.dest_tee_public_key = ""
+        self.dest_tee_public_key_bytes = b""
         self.att: dict = {}
         self.signer = Signer()
+        # our key pair is fixed for the process lifetime, so hex-encode the public key once
+        self.signer_public_key_hex = self.signer.get_public_key_der().hex()
         self.initialized = False
+        # finished answers by request digest, with their expiry time
+        self.responses: OrderedDict = OrderedDict()
+        self.pending: dict = {}
+
+    async def connect(self):
+        # parse the sparsity CA bundle once and share the context across all pooled connections
+        self.sparsity_ssl = ssl.create_default_context(cafile=CERT_PATH)
+        self.sparsity_http = httpx.AsyncClient(verify=self.sparsity_ssl, timeout=None, limits=HTTP_LIMITS)
+        self.web_http = httpx.AsyncClient(
+            timeout=REQUEST_TIMEOUT,
+            limits=HTTP_LIMITS,
+            follow_redirects=True,
+            headers={"User-Agent": "Mozilla/5.0"},
+        )
+        # all ECDH/AES and ECDSA work runs here, off the event loop thread
+        self.crypto_pool = ThreadPoolExecutor(max_workers=CRYPTO_WORKERS, thread_name_prefix="crypto")
 
+    async def disconnect(self):
+        await self.sparsity_http.aclose()
+        await self.web_http.aclose()
+        self.crypto_pool.shutdown()
 
-    def init_keys(self):
-        if not self.verify_attestation():
+    async def init_keys(self):
+        if not await self.verify_attestation():
             raise Exception('Attestation failed')
-        self.dest_tee_public_key = self.att["public_key"].hex()
-        logger.info(f"Dest TEE public key: {self.dest_tee_public_key}")
+        self.dest_tee_public_key_bytes = self.att["public_key"]
+        self.dest_tee_public_key = self.dest_tee_public_key_bytes.hex()
+        logger.info("Dest TEE public key: %s", self.dest_tee_public_key)
         self.initialized = True
     
-    def verify_attestation(self) -> bool:
+    async def verify_attestation(self) -> bool:
         logger.info("Verifying attestation: %s", self.sparsity_endpoint)
 
         try:
-            att = custom_get(f"{self.sparsity_endpoint}/attestation")
+            att = await custom_get(self.sparsity_http, f"{self.sparsity_endpoint}/attestation")
             logger.info("Received attestation response")
 
             if att.get("mock"):
@@ -79,161 +146,220 @@ class APP:
                 att = att["attestation_doc"]
                 self.att = Verifier.decode_attestation_dict(att)
                 result = Verifier.verify_attestation(att, "/app/util/root.pem")
-                logger.info(f"Attestation verification result: {result}")
+                logger.info("Attestation verification result: %s", result)
                 return result
         except Exception as e:
-            logger.error(f"Failed to verify attestation: {e}")
+            logger.error("Failed to verify attestation: %s", e)
             return False
 
     def init_router(self):
-        self.app.add_api_route("/ping", self.ping, methods=["GET"])
+        # plain Starlette route, ping needs no FastAPI parameter parsing or validation
+        self.app.add_route("/ping", self.ping, methods=["GET"])
         self.app.add_api_route("/attestation", self.attestation, methods=["GET"])
         self.app.add_api_route("/query", self.test_query, methods=["GET"])
         self.app.add_api_route("/talk", self.talk_to_ai, methods=["POST"])
         self.app.add_api_route("/test-ping", self.test_query_tee, methods=["GET"])
 
-    @staticmethod
-    def ping(request: Request):
-        return {"pong": int(time.time())}
+    async def ping(self, request: Request):
+        # health checks are the hottest route, so the body is rebuilt at most once a second
+        now = int(time.time())
+        if now != self.pong_time:
+            self.pong_time = now
+            self.pong_body = b'{"pong":%d}' % now
+        return Response(self.pong_body, media_type="application/json")
 
     async def attestation(self, request: Request):
         if self.vsock:
-            return JSONResponse({
+            return ORJSONResponse({
                 "attestation_doc": self.key.fixed_document
             })
         else:
-            return JSONResponse({
+            return ORJSONResponse({
                 "attestation_doc": self.key.fixed_document,
                 "mock": True
             })
     
+    async def run_crypto(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.crypto_pool, func, *args)
+
     def verify_signature(self, data, sig):
         return Verifier.verify_signature(
-            pub_key=bytes.fromhex(self.dest_tee_public_key),
+            pub_key=self.dest_tee_public_key_bytes,
             msg=data,
             signature=bytes.fromhex(sig)
         )
 
     async def talk_to_ai(self, req: ChatRequest):
         if not self.initialized:
-            self.init_keys()
-
-        req_resp_pairs = []
+            await self.init_keys()
 
-        nonce = bytes.fromhex(req.nonce)
+        try:
+            nonce = decode_field(req.nonce, req.encoding)
+            public_key = decode_field(req.public_key, req.encoding)
+            data = decode_field(req.data, req.encoding)
+        except ValueError:
+            return ORJSONResponse({"error": f"invalid {req.encoding} in request fields"})
         if len(nonce) < 8:
-            return JSONResponse({"error": "invalid nonce, must be at least 8 characters long"})
-
-        public_key = bytes.fromhex(req.public_key)
-        data = bytes.fromhex(req.data)
-
-        raw_data = self.key.decrypt(public_key, nonce, data)
-        logger.info(f"Raw data: {raw_data}")
+            return ORJSONResponse({"error": "invalid nonce, must be at least 8 characters long"})
+
+        raw_data = await self.run_crypto(self.key.decrypt, public_key, nonce, data)
+        logger.debug("Raw data: %s", raw_data)
+
+        chat_data = ChatData(**orjson.loads(raw_data))
+
+        result = await self.cached_resolve(chat_data)
+        if isinstance(result, dict):
+            return ORJSONResponse(result)
+        return await self.response(result, req.encoding)
+
+    async def cached_resolve(self, chat_data: ChatData):
+        key = hashlib.sha256(
+            f"{chat_data.api_key}|{chat_data.platform}|{chat_data.ai_model}|{chat_data.message}".encode()
+        ).hexdigest()
+        hit = self.responses.get(key)
+        if hit is not None and hit[1] > time.monotonic():
+            self.responses.move_to_end(key)
+            return hit[0]
+
+        # identical questions in flight share a single run of the pipeline
+        task = self.pending.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self.resolve_and_cache(key, chat_data))
+            self.pending[key] = task
+            task.add_done_callback(lambda _: self.pending.pop(key, None))
+        return await asyncio.shield(task)
+
+    async def resolve_and_cache(self, key: str, chat_data: ChatData):
+        result = await self.resolve(chat_data)
+        # errors are not cached, the next identical request retries
+        if isinstance(result, list):
+            self.responses[key] = (result, time.monotonic() + RESPONSE_CACHE_TTL)
+            if len(self.responses) > RESPONSE_CACHE_SIZE:
+                self.responses.popitem(last=False)
+        return result
+
+    async def resolve(self, chat_data: ChatData):
+        # returns the signed sparsity request/response pairs, or an error dict
+        req_resp_pairs = []
 
-        chat_data = ChatData(**json.loads(raw_data))
-        
         # Step 1: Modify user prompt to ask for relevant URLs
         original_message = chat_data.message
         url_list_prompt = url_prompt(chat_data.message)
         chat_data.message = url_list_prompt
-        chat_data_encoded = chat_data.json().encode()
+        chat_data_encoded = chat_data.to_bytes()
 
         # Send request to get URLs from sparsity endpoint
-        url_res = self.send_verify_request(f"{self.sparsity_endpoint}/talk", chat_data_encoded)
+        url_res = await self.send_verify_request(f"{self.sparsity_endpoint}/talk", chat_data_encoded)
         if url_res.get("error"):
-            return JSONResponse({"got error from sparsity": url_res["error"]})
+            return {"got error from sparsity": url_res["error"]}
         req_resp_pairs.append(url_res)
         
-        logger.info(f"URL response: {url_res}")
+        logger.debug("URL response: %s", url_res)
         url_response = url_res["data"]["response"]
 
         # Extract URLs from the response
         urls = extract_urls(url_response)
-        logger.info(f"Extracted URLs: {urls}")
-
-        # Step 2: Fetch HTML content for each URL
-        url_html_dict = {}
-        for url in urls[:3]:
-            logger.info(f"Fetching HTML for: {url}")
-            html = fetch_html(url)
-            url_html_dict[url] = html
-
-        # Step 3: Summarize each URL individually
-        url_summary_dict = {}
-        for url, html in url_html_dict.items():
-            logger.info(f"Summarizing content for: {url}")
-            sp = summary_prompt(original_message, url, html)
-            temp_chat_data = ChatData(
-                api_key=chat_data.api_key,
-                message=sp,
-                platform=chat_data.platform,
-                ai_model=chat_data.ai_model
-            )
-            temp_chat_data_encoded = temp_chat_data.json().encode()
-            summary_resp = self.send_verify_request(f"{self.sparsity_endpoint}/talk", temp_chat_data_encoded)
-            logger.info(f"Summary response: {summary_resp}")
-            url_summary_dict[url] = summary_resp["data"]["response"]
-            logger.info(f"Summary for {url}: {url_summary_dict[url]}")
-            req_resp_pairs.append(summary_resp)
-        # Step 4: Prepare final summary request using individual summaries
-        formatted_summaries = ""
-        for i, (url, summary) in enumerate(url_summary_dict.items(), 1):
-            formatted_summaries += f"url{i}:\n{url}\nSummary: {summary}\n\n"
-        fsp = final_summary_prompt(original_message, formatted_summaries)
-        chat_data.message = fsp
-        chat_data_encoded = chat_data.json().encode()
-
-        # Step 5: Send final summary request to sparsity endpoint
-        final_resp = self.send_verify_request(f"{self.sparsity_endpoint}/talk", chat_data_encoded)
-        if final_resp.get("error"):
-            return JSONResponse({"got error from sparsity": final_resp["error"]})
-        logger.info(f"Sparsity response data: {final_resp}")
-
-        req_resp_pairs.append(final_resp)
+        logger.info("Extracted URLs: %s", urls)
+        if not urls:
+            return {"error": "no urls found in sparsity response"}
+
+        # Step 2: Fetch HTML content for all URLs concurrently
+        # dedupe before capping so repeated URLs don't use up the page budget
+        urls = list(dict.fromkeys(urls))[:MAX_URLS]
+        logger.info("Fetching HTML for: %s", urls)
+        htmls = await asyncio.gather(*(fetch_html(self.web_http, url) for url in urls))
+        # pages that failed to load are dropped rather than summarized
+        url_html_dict = {url: html for url, html in zip(urls, htmls) if html is not None}
+        if not url_html_dict:
+            return {"error": "could not fetch any of the urls"}
+        urls = list(url_html_dict)
+
+        # Step 3: Summarize all URLs in a single request
+        logger.info("Summarizing content for: %s", urls)
+        sp = summary_prompt(original_message, url_html_dict)
+        temp_chat_data = ChatData(
+            api_key=chat_data.api_key,
+            message=sp,
+            platform=chat_data.platform,
+            ai_model=chat_data.ai_model
+        )
+        temp_chat_data_encoded = temp_chat_data.to_bytes()
+        summary_resp = await self.send_verify_request(f"{self.sparsity_endpoint}/talk", temp_chat_data_encoded)
+        if summary_resp.get("error"):
+            return {"got error from sparsity": summary_resp["error"]}
+        logger.debug("Summary response: %s", summary_resp)
+        req_resp_pairs.append(summary_resp)
+
+        # With a single source there is nothing to combine, its summary is the final answer
+        single_source = len(urls) == 1
+        if not single_source:
+            # Step 4: Prepare final summary request using the per-URL summaries
+            formatted_summaries = summary_resp["data"]["response"]
+            fsp = final_summary_prompt(original_message, formatted_summaries)
+            chat_data.message = fsp
+            chat_data_encoded = chat_data.to_bytes()
+
+            # Step 5: Send final summary request to sparsity endpoint
+            final_resp = await self.send_verify_request(f"{self.sparsity_endpoint}/talk", chat_data_encoded)
+            if final_resp.get("error"):
+                return {"got error from sparsity": final_resp["error"]}
+            logger.debug("Sparsity response data: %s", final_resp)
+
+            req_resp_pairs.append(final_resp)
 
         for i, pair in enumerate(req_resp_pairs):
             req_resp_pairs[i]["attestation_endpoint"] = f"{self.sparsity_endpoint}/attestation"
             if i == 0:
                 req_resp_pairs[i]["description"] = "urls to resolve query"
+            elif i == len(req_resp_pairs) - 1 and single_source:
+                req_resp_pairs[i]["description"] = "final summary of the single url content"
             elif i == len(req_resp_pairs) - 1:
                 req_resp_pairs[i]["description"] = "final summary combining all url content summaries"
             else:
                 req_resp_pairs[i]["description"] = "summaries for the url content"
 
-        return self.response(req_resp_pairs)
+        return req_resp_pairs
 
     async def test_query(self, request: Request):
-        data = requests.get("https://api.binance.com/api/v3/time").json()
-        return self.response(data)
+        resp = await self.web_http.get("https://api.binance.com/api/v3/time")
+        data = resp.json()
+        return await self.response(data)
 
     async def test_query_tee(self, request: Request):
-        data = requests.get("https://tee-app-2090887810.ap-northeast-2.elb.amazonaws.com/ping", 
-                            verify="/usr/local/share/ca-certificates/Certificate.crt").json()
-        return self.response(data)
-
-    def response(self, data):
-        return JSONResponse({
-            "sig": self.key.sign(data).hex(),
+        resp = await self.sparsity_http.get("https://tee-app-2090887810.ap-northeast-2.elb.amazonaws.com/ping")
+        data = resp.json()
+        return await self.response(data)
+
+    async def response(self, data, encoding: str = "hex"):
+        sig = await self.run_crypto(self.key.sign, data)
+        return ORJSONResponse({
+            "sig": encode_field(sig, encoding),
             "data": data,
         })
     
-    def send_verify_request(self, url, data):
+    async def send_verify_request(self, url, data):
         # get pubkey and nonce to send to sparsity
-        pubkey = self.signer.get_public_key_der().hex()
+        pubkey = self.signer_public_key_hex
         nonce = os.urandom(8)
+        # the ECDH behind encrypt and the ECDSA verify below are CPU-bound,
+        # keep them off the loop so other requests are served meanwhile
+        encrypted = await self.run_crypto(self.signer.encrypt, self.dest_tee_public_key_bytes, nonce, data)
 
         spars_req = {
             "public_key": pubkey,
             "nonce": nonce.hex(),
-            "data": self.signer.encrypt(bytes.fromhex(self.dest_tee_public_key), nonce, data).hex()
+            "data": encrypted.hex()
         }
-        resp = custom_post(url, spars_req)
+        resp = await custom_post(self.sparsity_http, url, spars_req)
+        # callers check resp.get("error"), so failures are returned as plain dicts
+        if resp is None:
+            return {"error": "no response from the sparsity endpoint"}
         if resp.get("error"):
-            return JSONResponse({"got error from sparsity": resp["error"]})
-        
-        sig_valid = self.verify_signature(resp['data'], resp['sig'])
+            return resp
+
+        sig_valid = "sig" in resp and await self.run_crypto(self.verify_signature, resp['data'], resp['sig'])
         if not sig_valid:
-            return JSONResponse({"error": "invalid signature from the sparsity endpoint"})
+            return {"error": "invalid signature from the sparsity endpoint"}
         
         return resp
 
@@ -248,4 +374,4 @@ if __name__ == "__main__":
     s = Server(ENCLAVE_SERVER_PORT, vsock=args.vsock)
 
     fd = s.fileno()
-    uvicorn.run(app.app, fd=fd)
+    uvicorn.run(app.app, fd=fd, loop="uvloop", http="httptools", log_level="warning")
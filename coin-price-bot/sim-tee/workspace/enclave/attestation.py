@@ -13,13 +13,24 @@ except ImportError:
 class EnclaveKeyManager(Signer):
     DOC_MAX_SIZE = 16 * 1024
     fd: int
+    public_key_der: bytes
+    public_key_hash: bytes
 
     def __init__(self):
         # Generate ECDSA P-384 key pair
         super().__init__()
+        # The key pair is fixed for the process lifetime, so serialize and hash it once
+        self.public_key_der = super().get_public_key_der()
+        self.public_key_hash = super().get_public_key_hash()
 
         self.load_nsm()
 
+    def get_public_key_der(self) -> bytes:
+        return self.public_key_der
+
+    def get_public_key_hash(self) -> bytes:
+        return self.public_key_hash
+
     def load_nsm(self):
         self.fd = libnsm.nsm_lib_init()
 
@@ -63,7 +74,7 @@ class MockFixedKeyManager(FixedKeyManager):
     def generate_attestation(self, nonce: bytes = b"") -> dict:
         return {
             "nonce": nonce.hex(),
-            "public_key": self.get_public_key_der().hex()
+            "public_key": self.public_key_der.hex()
         }
 
 
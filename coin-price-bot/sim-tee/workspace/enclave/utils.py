@@ -1,11 +1,37 @@
 import re
-from bs4 import BeautifulSoup, Comment
+import asyncio
+from bs4 import BeautifulSoup, Comment, SoupStrainer
 
-import requests
+import httpx
+import orjson
 
 from util.log import logger
 
 
+CERT_PATH = "/usr/local/share/ca-certificates/Certificate.crt"
+REQUEST_TIMEOUT = 10
+
+# Outbound calls go through the pooled httpx.AsyncClients that APP opens on
+# startup, so they reuse keep-alive connections and never block the event loop
+HTTP_LIMITS = httpx.Limits(max_keepalive_connections=32)
+JSON_HEADERS = {"content-type": "application/json"}
+
+# only the first 10000 characters of each cleaned page go into the summary prompt,
+# so there is no point downloading and parsing megabytes of markup to produce them
+MAX_HTML_BYTES = 200_000
+MAX_PAGE_CHARS = 10_000
+# only build the tree for the elements clean_html can return
+CONTENT_STRAINER = SoupStrainer(["main", "article", "body"])
+DROP_TAGS = frozenset(["script", "style", "noscript"])
+# Simple regex to extract URLs from text, compiled once at import
+URL_PATTERN = re.compile(r'https?://\S+')
+# punctuation the LLM tends to glue onto a URL ("see https://x.com/a.")
+URL_TRAILING_CHARS = ".,;:!?'\""
+# closing brackets are only trailing noise when the URL does not open them itself,
+# so ".../Bitcoin_(currency)" is kept whole while "(https://x.com/a)" loses the ")"
+URL_BRACKETS = {")": "(", "]": "[", "}": "{", ">": "<"}
+
+
 def url_prompt(user_prompt: str) -> str:
     return (
         "List me all the URLs you need to search for to get a result for the following prompt: "
@@ -16,10 +42,16 @@ def url_prompt(user_prompt: str) -> str:
         "I will do visit the websites myself, so just give me the URLS. NEVER say you can't provide any URLs."
     )
 
-def summary_prompt(user_prompt: str, url: str, html: str) -> str:
+def summary_prompt(user_prompt: str, url_htmls: dict) -> str:
+    # one request summarizes every page; fetch_html caps each page at MAX_PAGE_CHARS
+    # and talk_to_ai sends at most MAX_URLS (3) pages, so the prompt size stays bounded
+    pages = "\n\n".join(
+        f"url{i}:\n{url}\nContent:\n{html}" for i, (url, html) in enumerate(url_htmls.items(), 1)
+    )
     return (
-        f"Summarize the following HTML content from {url} regarding the user prompt: '{user_prompt}'. "
-        "If the content is not useful, say so.\n\n" + html[:10000]
+        f"Summarize the HTML content of each of the following URLs regarding the user prompt: '{user_prompt}'. "
+        "Answer with one section per URL, formatted as 'urlN:\n<url>\nSummary: <summary>', in the same order. "
+        "If the content of a URL is not useful, say so in its summary.\n\n" + pages
     )
 
 def final_summary_prompt(user_prompt: str, url_summaries: str) -> str:
@@ -29,23 +61,33 @@ def final_summary_prompt(user_prompt: str, url_summaries: str) -> str:
     )
 
 def extract_urls(text: str) -> list[str]:
-    # Simple regex to extract URLs from text
-    url_pattern = re.compile(r'https?://\S+')
-    return url_pattern.findall(text)
+    urls = []
+    for url in URL_PATTERN.findall(text):
+        while True:
+            url = url.rstrip(URL_TRAILING_CHARS)
+            opener = URL_BRACKETS.get(url[-1:])
+            if opener is None or url.count(opener) >= url.count(url[-1]):
+                break
+            url = url[:-1]
+        urls.append(url)
+    return urls
 
     
-def custom_get(url):
+async def custom_get(client: httpx.AsyncClient, url):
     try:
-        return requests.get(url, verify="/usr/local/share/ca-certificates/Certificate.crt").json()
+        resp = await client.get(url, timeout=REQUEST_TIMEOUT)
+        return orjson.loads(resp.content)
     except Exception as e:
-        logger.error(f"Failed to get {url}: {e}")
+        logger.error("Failed to get %s: %s", url, e)
         return None
 
-def custom_post(url, data):
+async def custom_post(client: httpx.AsyncClient, url, data):
     try:
-        return requests.post(url, json=data, verify="/usr/local/share/ca-certificates/Certificate.crt").json()
+        # encode with orjson instead of httpx's json= (stdlib json.dumps)
+        resp = await client.post(url, content=orjson.dumps(data), headers=JSON_HEADERS)
+        return orjson.loads(resp.content)
     except Exception as e:
-        logger.error(f"Failed to post {url}: {e}")
+        logger.error("Failed to post %s: %s", url, e)
         return None
 
 def clean_html(html: str) -> str:
@@ -53,25 +95,37 @@ def clean_html(html: str) -> str:
     Remove scripts, styles, noscript, and comments, but keep semantic tags (h1, table, ul, etc).
     Returns the main content (main, article, or body).
     """
-    soup = BeautifulSoup(html, 'html.parser')
-    for tag in soup(["script", "style", "noscript"]):
-        tag.decompose()
-    # Remove comments
-    for comment in soup.find_all(string=lambda text: isinstance(text, Comment)):
-        comment.extract()
+    soup = BeautifulSoup(html, 'lxml', parse_only=CONTENT_STRAINER)
+    # Collect scripts, styles and comments in a single pass over the tree, then drop them
+    junk = [
+        node for node in soup.descendants
+        if isinstance(node, Comment) or node.name in DROP_TAGS
+    ]
+    for node in junk:
+        node.extract()
     # Return main content
     return str(soup.find('main') or soup.find('article') or soup.body)
 
-def fetch_html(url):
+async def fetch_html(client: httpx.AsyncClient, url):
     # Fetch the raw HTML from the URL and process it
     try:
-        headers = {"User-Agent": "Mozilla/5.0"}
-        response = requests.get(url, headers=headers, timeout=10)
-        response.raise_for_status()
-        html_content = response.text
-        processed_html = clean_html(html_content)
-        return processed_html
+        # Stream the body and stop reading once MAX_HTML_BYTES have arrived
+        async with client.stream("GET", url) as response:
+            response.raise_for_status()
+            chunks, size = [], 0
+            async for chunk in response.aiter_bytes():
+                chunks.append(chunk)
+                size += len(chunk)
+                if size >= MAX_HTML_BYTES:
+                    break
+            encoding = response.encoding or "utf-8"
+        # the cut may split a multi-byte character, replace it rather than fail
+        html_content = b"".join(chunks)[:MAX_HTML_BYTES].decode(encoding, errors="replace")
+        # parsing is CPU-bound, run it in a worker thread so other requests keep being served
+        processed_html = await asyncio.to_thread(clean_html, html_content)
+        # truncate right away so only the part that reaches the prompt is kept around
+        return processed_html[:MAX_PAGE_CHARS]
     except Exception as e:
-        error_msg = f"[ERROR] Could not fetch HTML: {e}"
-        print(f"  {error_msg}")
-        return error_msg
\ No newline at end of file
+        # None lets the caller drop the page instead of summarizing an error message
+        logger.error("Could not fetch HTML from %s: %s", url, e)
+        return None
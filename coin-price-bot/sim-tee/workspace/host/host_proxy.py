@@ -1,10 +1,16 @@
 from typing import Optional
 import asyncio
+import struct
 
 from util.log import logger
 from util.server import Handler
 
 
+# big-endian length fields of the TLS ClientHello
+U16 = struct.Struct(">H")
+EXT_HEADER = struct.Struct(">HH")
+
+
 class HostProxyHandler(Handler):
     async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
         #TODO: Implement HostProxyHandler
@@ -16,11 +22,14 @@ class HostProxyHandler(Handler):
             if len(data) < 5 or data[0] != 0x16:
                 raise ValueError("Not a TLS handshake record")
 
+            # Read lengths in place instead of slicing a new bytes object for each field
+            mv = memoryview(data)
+
             # Skip record header
             idx = 5
 
             # Check handshake type
-            if data[idx] != 0x01:
+            if mv[idx] != 0x01:
                 raise ValueError("Not a ClientHello")
 
             # Skip handshake header (1 + 3 bytes length)
@@ -30,34 +39,32 @@ class HostProxyHandler(Handler):
             idx += 2 + 32
 
             # Session ID
-            session_id_len = data[idx]
+            session_id_len = mv[idx]
             idx += 1 + session_id_len
 
             # Cipher suites
-            cipher_suites_len = int.from_bytes(data[idx:idx + 2], 'big')
+            cipher_suites_len, = U16.unpack_from(mv, idx)
             idx += 2 + cipher_suites_len
 
             # Compression methods
-            comp_methods_len = data[idx]
+            comp_methods_len = mv[idx]
             idx += 1 + comp_methods_len
 
             # Extensions total length
-            ext_total_len = int.from_bytes(data[idx:idx + 2], 'big')
+            ext_total_len, = U16.unpack_from(mv, idx)
             idx += 2
 
             end = idx + ext_total_len
             while idx + 4 <= end:
-                ext_type = int.from_bytes(data[idx:idx + 2], 'big')
-                ext_len = int.from_bytes(data[idx + 2:idx + 4], 'big')
-                ext_data = data[idx + 4:idx + 4 + ext_len]
+                ext_type, ext_len = EXT_HEADER.unpack_from(mv, idx)
+                ext_data = mv[idx + 4:idx + 4 + ext_len]  # a view, not a copy
 
                 if ext_type == 0x00:  # SNI
                     # ext_data: [list_len(2)][type(1)=0][name_len(2)][name]
-                    list_len = int.from_bytes(ext_data[0:2], 'big')
                     if ext_data[2] != 0:  # name type != host_name
                         break
-                    name_len = int.from_bytes(ext_data[3:5], 'big')
-                    server_name = ext_data[5:5 + name_len].decode()
+                    name_len, = U16.unpack_from(ext_data, 3)
+                    server_name = bytes(ext_data[5:5 + name_len]).decode()
                     return server_name
 
                 idx += 4 + ext_len
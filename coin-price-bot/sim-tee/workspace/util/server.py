@@ -15,6 +15,10 @@ HOST_SERVER_PORT = 8000
 HOST_PROXY_SERVER_PORT = 9981
 ENCLAVE_SERVER_PORT = 9982
 
+SPLICE_CHUNK_SIZE = 1 << 20
+RELAY_BUFFER_SIZE = 64 * 1024
+ACCEPT_RETRY_DELAY = 0.1  # seconds
+
 
 def worker(pipe, family, handler):
     fd = recv_handle(pipe)
@@ -24,12 +28,29 @@ def worker(pipe, family, handler):
 
 
 async def start_server(handler, sock: socket.socket):
-    server = await asyncio.start_server(handler.handle_connection, sock=sock)
-    async with server:
-        await server.serve_forever()
+    loop = asyncio.get_running_loop()
+    tasks = set()
+    while True:
+        try:
+            conn, _ = await loop.sock_accept(sock)
+        except OSError as e:
+            # e.g. EMFILE/ENFILE when out of descriptors, or ECONNABORTED from a client
+            # that gave up in the backlog; back off and keep serving
+            logger.error("accept failed: %s", e)
+            await asyncio.sleep(ACCEPT_RETRY_DELAY)
+            continue
+        conn.setblocking(False)
+        task = asyncio.create_task(handler.handle_socket(conn))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
 
 
 class Handler:
+    async def handle_socket(self, sock: socket.socket):
+        # handlers work on asyncio streams unless they override this to use the raw socket
+        reader, writer = await asyncio.open_connection(sock=sock)
+        await self.handle_connection(reader, writer)
+
     async def handle_connection(self, reader, writer):
         raise NotImplementedError()
 
@@ -37,7 +58,7 @@ class Handler:
     async def pipe(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
         try:
             while True:
-                data = await reader.read(4096)
+                data = await reader.read(RELAY_BUFFER_SIZE)
                 if not data:
                     break
                 writer.write(data)
@@ -59,6 +80,118 @@ class Handler:
             except Exception:
                 pass
 
+    @staticmethod
+    async def relay(a: socket.socket, b: socket.socket):
+        """
+        Splice a and b into each other until both directions reach EOF, then close both
+        sockets. If one direction fails the other is cancelled instead of waiting on a
+        peer that may never send again.
+        """
+        tasks = [asyncio.ensure_future(Handler.splice(a, b)), asyncio.ensure_future(Handler.splice(b, a))]
+        try:
+            for done in asyncio.as_completed(tasks):
+                if not await done:
+                    break
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            a.close()
+            b.close()
+
+    @staticmethod
+    async def splice(src: socket.socket, dst: socket.socket) -> bool:
+        """
+        Forward bytes from src to dst until EOF, then shut down the writing side of dst.
+        On Linux the bytes move through a kernel pipe with splice(2) and never enter
+        user space; otherwise a single preallocated buffer is reused for every chunk.
+        Returns False if the connection broke or the relay was cancelled before EOF.
+        """
+        loop = asyncio.get_running_loop()
+        try:
+            if hasattr(os, "splice"):
+                await Handler.splice_kernel(loop, src, dst)
+            else:
+                await Handler.splice_buffered(loop, src, dst)
+            return True
+        except (asyncio.CancelledError, ConnectionResetError):
+            return False
+        except OSError as e:
+            if e.errno not in (errno.ENOTCONN, errno.ECONNRESET, errno.EPIPE, errno.EBADF):
+                raise
+            return False
+        finally:
+            try:
+                dst.shutdown(socket.SHUT_WR)
+            except OSError:
+                pass
+
+    @staticmethod
+    async def splice_kernel(loop, src: socket.socket, dst: socket.socket):
+        # a socket family without splice(2) support (e.g. older vsock kernels) fails
+        # with EINVAL; the relay then falls back to splice_buffered without losing
+        # any bytes that already sit in the pipe
+        flags = os.SPLICE_F_MOVE | os.SPLICE_F_NONBLOCK
+        pipe_r, pipe_w = os.pipe()
+        try:
+            first = True
+            while True:
+                try:
+                    n = os.splice(src.fileno(), pipe_w, SPLICE_CHUNK_SIZE, flags=flags)
+                except BlockingIOError:
+                    await wait_fd(loop.add_reader, loop.remove_reader, src.fileno())
+                    continue
+                except OSError as e:
+                    # only the first splice can tell src is unsupported, the pipe is still empty then
+                    if e.errno != errno.EINVAL or not first:
+                        raise
+                    return await Handler.splice_buffered(loop, src, dst)
+                first = False
+                if n == 0:
+                    return
+
+                while n:
+                    try:
+                        n -= os.splice(pipe_r, dst.fileno(), n, flags=flags)
+                    except BlockingIOError:
+                        await wait_fd(loop.add_writer, loop.remove_writer, dst.fileno())
+                    except OSError as e:
+                        if e.errno != errno.EINVAL:
+                            raise
+                        # dst does not take splice(2), send what is left in the pipe by hand first
+                        while n:
+                            data = os.read(pipe_r, n)
+                            n -= len(data)
+                            await loop.sock_sendall(dst, data)
+                        return await Handler.splice_buffered(loop, src, dst)
+        finally:
+            os.close(pipe_r)
+            os.close(pipe_w)
+
+    @staticmethod
+    async def splice_buffered(loop, src: socket.socket, dst: socket.socket):
+        buf = bytearray(RELAY_BUFFER_SIZE)
+        view = memoryview(buf)
+        while True:
+            n = await loop.sock_recv_into(src, buf)
+            if n == 0:
+                return
+            await loop.sock_sendall(dst, view[:n])
+
+
+async def wait_fd(add, remove, fd: int):
+    future = asyncio.get_running_loop().create_future()
+
+    def on_ready():
+        if not future.done():
+            future.set_result(None)
+
+    add(fd, on_ready)
+    try:
+        await future
+    finally:
+        remove(fd)
+
 
 class Server:
     server_port: int
@@ -93,6 +226,9 @@ class Server:
             self.handler = Handler()
         else:
             self.handler = conn_handler
+        # the handler does not change after construction, so pickle it once for
+        # every worker, including the ones monitor_workers restarts
+        self.handler_blob = pickle.dumps(self.handler, protocol=pickle.HIGHEST_PROTOCOL)
 
         self.parent_conn, self.child_conn = multiprocessing.Pipe()
 
@@ -112,7 +248,7 @@ class Server:
             self.start_one_worker()
 
     def start_one_worker(self):
-        p = Process(target=worker, args=(self.child_conn, self.family, pickle.dumps(self.handler), ))
+        p = Process(target=worker, args=(self.child_conn, self.family, self.handler_blob, ))
         p.start()
         logger.info(f"worker {p.pid} started.")
         self.processes.append(p)
@@ -12,6 +12,7 @@ class ClientRequest:
     public_key: str = ""
     api_key: str
     att: dict
+    session: requests.Session
 
     def __init__(self, tee_endpoint: str = "http://127.0.0.1:8000"):
         self.api_key = os.getenv("PLATFORM_API_KEY")
@@ -20,6 +21,8 @@ class ClientRequest:
         if not self.api_key:
             raise Exception('API key is required')
         self.tee_endpoint = tee_endpoint
+        # one keep-alive connection serves the attestation fetch and every chat call
+        self.session = requests.Session()
         self.signer = Signer()
         self.init_keys()
 